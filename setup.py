@@ -9,9 +9,10 @@ setup(name='sim2600',
       packages=['sim2600'],
       include_dirs=[np.get_include()], 
       ext_modules = cythonize(["sim2600/mycircuitsimulator.pyx",
+                               "sim2600/compareloop.pyx",
                                "sim2600/cirsim.cc"], 
                               language='c++', 
-                              extra_compile_args=['-O2', '-g']), 
+                              extra_compile_args=['-O3', '-march=native', '-g']), 
       package_data={'sim2600': ['chips/*', 'roms/*']},
      )
 
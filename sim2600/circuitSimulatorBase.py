@@ -20,8 +20,10 @@
 
 import os, pickle, traceback
 from array import array
-from nmosFet import NmosFet
-from wire import Wire
+import numpy as np
+import netlistCache
+from nmosFet import NmosFet, TransistorArray
+from wire import Wire, WireArray
 
 class CircuitSimulatorBase:
     def __init__(self):
@@ -34,6 +36,11 @@ class CircuitSimulatorBase:
 
         self.recalcArray = None
 
+        # Columns of getWireArray() and getTransistorArray() that never
+        # change once the circuit is loaded.  Built on first use.
+        self.wireColumns = None
+        self.transistorColumns = None
+
         # Performance / diagnostic info as sim progresses
         self.numAddWireToGroup = 0
         self.numAddWireTransistor = 0
@@ -297,6 +304,7 @@ class CircuitSimulatorBase:
                 self.wireList[k].name = name
                 self.wireNames[name] = k
                 i += 1
+        self.wireColumns = None
 
 
     def getWires(self):
@@ -305,8 +313,41 @@ class CircuitSimulatorBase:
     def getTransistors(self):
         return self.transistorList
 
-    def getWiresState(self):
-        return [w.state for w in self.wireList]
+    def getWiresState(self, out=None):
+        """ If out is given, the state is written into it instead of
+        into a new list """
+        if out is None:
+            return [w.state for w in self.wireList]
+        out[:] = [w.state for w in self.wireList]
+        return out
+
+    def getWireArray(self):
+        """ Snapshot of every wire as a WireArray.  Only state and
+        pulled are gathered per call. """
+        numWires = len(self.wireList)
+        if self.wireColumns == None:
+            self.wireColumns = (
+                np.fromiter((w.index for w in self.wireList), np.int32, numWires),
+                [w.name for w in self.wireList])
+        index, names = self.wireColumns
+        state = np.fromiter((w.state for w in self.wireList), np.int32, numWires)
+        pulled = np.fromiter((w.pulled for w in self.wireList), np.int32, numWires)
+        return WireArray(index, names, state, pulled)
+
+    def getTransistorArray(self):
+        """ Snapshot of every transistor as a TransistorArray.  Only
+        gateState is gathered per call. """
+        numFets = len(self.transistorList)
+        if self.transistorColumns == None:
+            self.transistorColumns = tuple(
+                np.fromiter((getattr(t, attr) for t in self.transistorList),
+                            np.int32, numFets)
+                for attr in ('index', 'side1WireIndex', 'side2WireIndex',
+                             'gateWireIndex'))
+        index, side1, side2, gate = self.transistorColumns
+        gateState = np.fromiter((t.gateState for t in self.transistorList),
+                                np.int32, numFets)
+        return TransistorArray(index, gateState, side1, side2, gate)
 
     def getPulledState(self):
         return [w.pulled for w in self.wireList]
@@ -321,9 +362,7 @@ class CircuitSimulatorBase:
                             (filePath, os.getcwd()))
         print 'Loading %s' % filePath
         
-        of = open (filePath, 'rb')
-        rootObj = pickle.load (of)
-        of.close()
+        rootObj = netlistCache.loadNetlist(filePath)
 
         numWires = rootObj['NUM_WIRES']
         nextCtrl = rootObj['NEXT_CTRL']
@@ -487,3 +526,5 @@ class CircuitSimulatorBase:
         of = open(filePath, 'wb')
         pickle.dump(rootObj, of)
         of.close()
+        # A cached copy of a rewritten file would be stale
+        netlistCache.clearNetlists()
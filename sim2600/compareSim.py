@@ -34,15 +34,23 @@ class MainSim:
         # For measuring how fast the simulation is running
         self.lastUpdateTimeSec = None
 
-    def runsim(self, halfClocks=100, outfile='results.db'):
-        dbmgr = database.DatabaseManager(outfile)
-        for i in range(halfClocks):
-            self.sim.advanceOneHalfClock()
-            dbmgr.commit(
-                i,
-                self.sim.sim6507.getWires(),
-                self.sim.sim6507.getTransistors()
-            )
+    def runsim(self, halfClocks=100, outfile='results.db', binary=False,
+               overwrite=False, commit_every=1, delta=False):
+        if binary and delta:
+            raise ValueError('delta encoding is only supported by the SQLite dump')
+        if binary:
+            dbmgr = database.BinaryDumpManager(outfile, overwrite, commit_every)
+        else:
+            dbmgr = database.DatabaseManager(outfile, overwrite, commit_every,
+                                             delta)
+        with dbmgr:
+            for i in range(halfClocks):
+                self.sim.advanceOneHalfClock()
+                dbmgr.commit(
+                    i,
+                    self.sim.sim6507.getWireArray(),
+                    self.sim.sim6507.getTransistorArray()
+                )
             
             # for wire in self.sim.sim6507.getWires():
             #     print(wire)
@@ -0,0 +1,38 @@
+#cython: language_level=2, boundscheck=False, wraparound=False
+
+# Inner loop of the simulator comparison tests.  Runs two consoles in
+# lockstep and records the 6507 and TIA wire states after every
+# halfclock, so the interpreter is not dispatching the loop itself.
+
+cpdef int record_states(sim1, sim2, int iters,
+                        cpu1, cpu2, tia1, tia2) except -1:
+    """ Advance sim1 and sim2 iters halfclocks, writing the wire states
+    of halfclock i into row i of the (iters, nwires) uint8 arrays cpu1,
+    cpu2 (6507) and tia1, tia2 (TIA) """
+    cdef int i
+    # Bind the bound methods once; the loop body then does no
+    # attribute lookups
+    adv1, adv2 = sim1.advanceOneHalfClock, sim2.advanceOneHalfClock
+    gw1, gw2 = sim1.sim6507.getWiresState, sim2.sim6507.getWiresState
+    gt1, gt2 = sim1.simTIA.getWiresState, sim2.simTIA.getWiresState
+    for i in range(iters):
+        adv1()
+        adv2()
+        gw1(out=cpu1[i])
+        gw2(out=cpu2[i])
+        gt1(out=tia1[i])
+        gt2(out=tia2[i])
+    return 0
+
+cpdef Py_ssize_t first_mismatch(unsigned char[:, ::1] a,
+                                unsigned char[:, ::1] b) except -2:
+    """ Flat index of the first element where the recordings a and b
+    differ, or -1 if they are identical """
+    cdef Py_ssize_t i, j
+    if a.shape[0] != b.shape[0] or a.shape[1] != b.shape[1]:
+        raise ValueError('Recordings have different shapes')
+    for i in range(a.shape[0]):
+        for j in range(a.shape[1]):
+            if a[i, j] != b[i, j]:
+                return i * a.shape[1] + j
+    return -1
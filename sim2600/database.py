@@ -2,95 +2,249 @@
 
 import os
 import sys
+import json
 import sqlite3
 
+import numpy as np
+
 class DatabaseManager:
 
     TRANSISTOR_TABLE = 'transistors'
     WIRE_TABLE = 'wires'
 
-    CREATE_TABLE = 'CREATE TABLE %s%s'
-
-    WIRE_TABLE_DEF = '(idx INT, halfclock INT, name TEXT, state INT, pulled INT)'
-    WIRE_INSERT = 'INSERT INTO %s VALUES (?,?,?,?,?)' % (WIRE_TABLE,)
+    WIRE_CREATE = 'CREATE TABLE wires(idx INT, halfclock INT, name TEXT, state INT, pulled INT)'
+    WIRE_INSERT = 'INSERT INTO wires VALUES (?,?,?,?,?)'
 
-    TRANS_TABLE_DEF = '(idx INT, halfclock INT, state INT, side1WireIndexI INT, side2WireIndex INT, gateWireIndex INT)'
-    TRANS_INSERT = 'INSERT INTO %s VALUES (?,?,?,?,?,?)' % (TRANSISTOR_TABLE,)
+    TRANS_CREATE = 'CREATE TABLE transistors(idx INT, halfclock INT, state INT, side1WireIndexI INT, side2WireIndex INT, gateWireIndex INT)'
+    TRANS_INSERT = 'INSERT INTO transistors VALUES (?,?,?,?,?,?)'
 
-    def __init__(self, filename):
+    def __init__(self, filename, overwrite=False, commit_every=1, delta=False):
         self.filename = filename
+        # Only every commit_every-th call to commit() is written
+        if commit_every < 1:
+            raise ValueError('commit_every must be at least 1, got %r' % (commit_every,))
+        self.commit_every = commit_every
+        self.commit_calls = 0
+        # If delta is set, a row is only written when it differs from the
+        # previous commit; readers fill each idx forward to reconstruct.
+        # key is the table name, value is the columns last committed.
+        self.delta = delta
+        self.prev_columns = dict()
         if os.path.exists(self.filename):
-            confirmation = ''
-            while confirmation != 'y' and confirmation != 'n':
-                confirmation = raw_input('Database file already exists. Overwrite? (y/n)')
-
-            if confirmation == 'y':
+            if overwrite:
                 os.remove(filename)
             else:
                 raise ValueError('File already exists, try again with a different filename')
-        
-        self.connection = sqlite3.connect(self.filename)
+
+        # Dumps are scratch output, so trade durability for write speed.
+        # The connection is in autocommit mode; commit() issues its own
+        # BEGIN/COMMIT rather than relying on the module's implicit ones.
+        self.connection = sqlite3.connect(self.filename, isolation_level=None)
+        self.connection.execute('PRAGMA synchronous=OFF')
+        self.connection.execute('PRAGMA journal_mode=MEMORY')
+        self.connection.execute('PRAGMA temp_store=MEMORY')
         self.cursor = self.connection.cursor()
 
         self._initdb()
 
 
-    def __del__(self):
-        '''Close the database connection when this object goes out of scope'''
-        try:
-            self.connection.close()
-        except AttributeError:
-            pass
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+    def close(self):
+        '''Close the database connection'''
+        self.connection.close()
 
     
     def _initdb(self):
         '''Initialize the database to store the transistor and wire info'''
-        # First create the initial tables
-        create_wires = self.CREATE_TABLE % (self.WIRE_TABLE, self.WIRE_TABLE_DEF)
-        create_trans = self.CREATE_TABLE % (self.TRANSISTOR_TABLE, self.TRANS_TABLE_DEF)
-        
-        self.cursor.execute(create_wires)
-        self.cursor.execute(create_trans)
+        self.cursor.execute(self.WIRE_CREATE)
+        self.cursor.execute(self.TRANS_CREATE)
 
-        self.connection.commit()
 
+    def _changed_rows(self, table, *columns):
+        '''Indices of the rows where any column differs from the last
+        commit to table.  Every row counts as changed the first time.'''
+        n = len(columns[0])
+        prev = self.prev_columns.get(table)
+        self.prev_columns[table] = [c.copy() for c in columns]
+        if prev is None:
+            return np.arange(n)
 
-    def _commit_wires(self, halfclock, wires):
-        '''Commit all wires to the database'''
-        wire_tups = []
-        for wire in wires:
-            tup = (
-                wire.index,
-                halfclock,
-                wire.name,
-                wire.state,
-                wire.pulled
-            )
-            wire_tups.append(tup)
+        changed = np.zeros(n, dtype=bool)
+        for cur, old in zip(columns, prev):
+            changed |= cur != old
+        return np.flatnonzero(changed)
 
-        self.cursor.executemany(self.WIRE_INSERT, wire_tups)
+
+    def _commit_wires(self, halfclock, wires):
+        '''Commit all wires to the database, given a WireArray'''
+        index, name, state, pulled = wires.index, wires.name, wires.state, wires.pulled
+        if self.delta:
+            rows = self._changed_rows(self.WIRE_TABLE, state, pulled)
+            index, state, pulled = index[rows], state[rows], pulled[rows]
+            name = [name[i] for i in rows.tolist()]
+
+        n = len(index)
+        self.cursor.executemany(self.WIRE_INSERT, zip(
+            index.tolist(),
+            [halfclock] * n,
+            name,
+            state.tolist(),
+            pulled.tolist()
+        ))
 
 
     def _commit_transistors(self, halfclock, transistors):
-        '''Commit all transistors to the database'''
-        trans_tups = []
-        for transistor in transistors:
-            tup = (
-                transistor.index,
-                halfclock,
-                transistor.gateState,
-                transistor.side1WireIndex,
-                transistor.side2WireIndex,
-                transistor.gateWireIndex
-            )
-            trans_tups.append(tup)
-        
-        self.cursor.executemany(self.TRANS_INSERT, trans_tups)
+        '''Commit all transistors to the database, given a TransistorArray'''
+        t = transistors
+        columns = (t.index, t.gateState, t.side1WireIndex, t.side2WireIndex, t.gateWireIndex)
+        if self.delta:
+            # Only gateState changes as the simulation runs
+            rows = self._changed_rows(self.TRANSISTOR_TABLE, t.gateState)
+            columns = [c[rows] for c in columns]
+
+        index, gateState, side1, side2, gate = columns
+        n = len(index)
+        self.cursor.executemany(self.TRANS_INSERT, zip(
+            index.tolist(),
+            [halfclock] * n,
+            gateState.tolist(),
+            side1.tolist(),
+            side2.tolist(),
+            gate.tolist()
+        ))
 
 
     def commit(self, halfclock, wires, transistors):
         '''Commit all wires and transistors to the database'''
-        self._commit_wires(halfclock, wires)
-        self._commit_transistors(halfclock, transistors)
+        self.commit_calls += 1
+        if (self.commit_calls - 1) % self.commit_every:
+            return
 
-        self.connection.commit()
+        # Both inserts share a single transaction
+        self.cursor.execute('BEGIN IMMEDIATE')
+        try:
+            self._commit_wires(halfclock, wires)
+            self._commit_transistors(halfclock, transistors)
+        except:
+            self.cursor.execute('ROLLBACK')
+            # The delta baseline may include the rolled back frame, so
+            # the next commit writes every row again
+            self.prev_columns.clear()
+            raise
+        self.cursor.execute('COMMIT')
+
+
+class BinaryDumpManager:
+    '''Append-only binary alternative to DatabaseManager.
+
+    Every commit() appends one frame of fixed-size records to
+    <filename>.wires and <filename>.trans, and the wire index -> name table
+    is written once to <filename>.json.  Read a dump back with load().'''
+
+    WIRE_DT = np.dtype([('idx', 'i4'), ('hc', 'i4'), ('state', 'i1'), ('pulled', 'i1')])
+    TRANS_DT = np.dtype([('idx', 'i4'), ('hc', 'i4'), ('state', 'i1'),
+                         ('side1WireIndex', 'i4'), ('side2WireIndex', 'i4'),
+                         ('gateWireIndex', 'i4')])
+
+    WIRE_SUFFIX = '.wires'
+    TRANS_SUFFIX = '.trans'
+    NAMES_SUFFIX = '.json'
+
+    def __init__(self, filename, overwrite=False, commit_every=1):
+        self.filename = filename
+        # Only every commit_every-th call to commit() is written
+        if commit_every < 1:
+            raise ValueError('commit_every must be at least 1, got %r' % (commit_every,))
+        self.commit_every = commit_every
+        self.commit_calls = 0
+        for suffix in (self.WIRE_SUFFIX, self.TRANS_SUFFIX, self.NAMES_SUFFIX):
+            if os.path.exists(self.filename + suffix):
+                if overwrite:
+                    os.remove(self.filename + suffix)
+                else:
+                    raise ValueError('File already exists, try again with a different filename')
+
+        self.wireFile = open(self.filename + self.WIRE_SUFFIX, 'wb')
+        self.transFile = open(self.filename + self.TRANS_SUFFIX, 'wb')
+
+        # Frame buffers are allocated on the first commit and reused
+        self.wireFrame = None
+        self.transFrame = None
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+    def close(self):
+        '''Close the dump files.  A dump with no frames still gets an
+        (empty) name table, so load() can read it back.'''
+        if self.wireFrame is None:
+            self._write_names({})
+        self.wireFile.close()
+        self.transFile.close()
+
+
+    def _write_names(self, names):
+        '''Write the wire index -> name table'''
+        with open(self.filename + self.NAMES_SUFFIX, 'w') as f:
+            json.dump(names, f)
+
+
+    def commit(self, halfclock, wires, transistors):
+        '''Append one frame of wires and transistors to the dump'''
+        self.commit_calls += 1
+        if (self.commit_calls - 1) % self.commit_every:
+            return
+
+        if self.wireFrame is None:
+            self._write_names(dict(zip(wires.index.tolist(), wires.name)))
+            self.wireFrame = np.empty(len(wires), dtype=self.WIRE_DT)
+            self.wireFrame['idx'] = wires.index
+            self.transFrame = np.empty(len(transistors), dtype=self.TRANS_DT)
+            self.transFrame['idx'] = transistors.index
+
+        self.wireFrame['hc'] = halfclock
+        self.wireFrame['state'] = wires.state
+        self.wireFrame['pulled'] = wires.pulled
+        self.wireFrame.tofile(self.wireFile)
+
+        self.transFrame['hc'] = halfclock
+        self.transFrame['state'] = transistors.gateState
+        self.transFrame['side1WireIndex'] = transistors.side1WireIndex
+        self.transFrame['side2WireIndex'] = transistors.side2WireIndex
+        self.transFrame['gateWireIndex'] = transistors.gateWireIndex
+        self.transFrame.tofile(self.transFile)
+
+
+    @staticmethod
+    def _map(path, dtype):
+        '''Map path read-only as an array of dtype records'''
+        # np.memmap refuses to map an empty file
+        if os.path.getsize(path) == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode='r')
+
+
+    @classmethod
+    def load(cls, filename):
+        '''Map a finished dump read-only.  Returns (wires, transistors,
+        names), where wires and transistors are flat structured arrays of
+        every committed frame and names maps wire index -> name.  A dump
+        with no frames loads as empty arrays.'''
+        wires = cls._map(filename + cls.WIRE_SUFFIX, cls.WIRE_DT)
+        transistors = cls._map(filename + cls.TRANS_SUFFIX, cls.TRANS_DT)
+        with open(filename + cls.NAMES_SUFFIX) as f:
+            names = dict((int(k), v) for k, v in json.load(f).items())
+        return wires, transistors, names
@@ -17,7 +17,7 @@
 # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
-#cython: language_level=2, boundscheck=False, wraparound=False, nonecheck=False, initializedcheck=False, overflowcheck=False
+#cython: language_level=2, boundscheck=False, wraparound=False, nonecheck=False, initializedcheck=False, overflowcheck=False, cdivision=True
 
 import os, pickle, traceback
 from array import array
@@ -33,6 +33,10 @@ from cython.operator cimport dereference as deref
 import copy
 import sys
 
+import netlistCache
+from wire import WireArray
+from nmosFet import TransistorArray
+
 
 
 cdef extern from "cirsim.h" :
@@ -114,6 +118,13 @@ class CircuitSimulator(object):
         self.halfClkCount = 0       # the number of half clock cycles (low to high or high to low)
                                     # that the simulation has run
 
+        # Columns of getWireArray() and getTransistorArray() that never
+        # change once the circuit is loaded.  Built on first use.
+        self.wireColumns = None
+        self.transistorColumns = None
+
+        # buildConnectivity() tuple for the loaded circuit
+        self.connectivity = None
 
         # Performance / diagnostic info as sim progresses
         self.numAddWireToGroup = 0
@@ -304,9 +315,15 @@ class CircuitSimulator(object):
                 self._wireList[k].name = name
                 self.wireNames[name] = k
                 i += 1
-
-    def getWiresState(self):
-        return np.array(self._wireState)
+        self.wireColumns = None
+
+    def getWiresState(self, out=None):
+        """ If out is given, the state is copied into it instead of
+        into a new array """
+        if out is None:
+            return np.array(self._wireState)
+        out[:] = self._wireState
+        return out
  
     def getPulledState(self):
         return np.array(self._wirePulled)
@@ -314,6 +331,32 @@ class CircuitSimulator(object):
     def getTransistorState(self):
         return np.array(self._transistorState)
 
+    def getWireArray(self):
+        """ Snapshot of every wire as a WireArray, copied straight
+        from the state arrays """
+        if self.wireColumns is None:
+            self.wireColumns = (
+                np.array([w.index for w in self._wireList], dtype=np.int32),
+                [w.name for w in self._wireList])
+        index, names = self.wireColumns
+        return WireArray(index, names,
+                         np.asarray(self._wireState, dtype=np.int32),
+                         np.asarray(self._wirePulled, dtype=np.int32))
+
+    def getTransistorArray(self):
+        """ Snapshot of every transistor as a TransistorArray, copied
+        straight from the state arrays """
+        if self.transistorColumns is None:
+            self.transistorColumns = tuple(
+                np.array([getattr(t, attr) for t in self._transistorList],
+                         dtype=np.int32)
+                for attr in ('index', 'side1WireIndex', 'side2WireIndex',
+                             'gateWireIndex'))
+        index, side1, side2, gate = self.transistorColumns
+        return TransistorArray(index,
+                               np.asarray(self._transistorState, dtype=np.int32),
+                               side1, side2, gate)
+
     def loadCircuit (self, filePath):
 
         if not os.path.exists(filePath):
@@ -321,9 +364,7 @@ class CircuitSimulator(object):
                             (filePath, os.getcwd()))
         print 'Loading %s' % filePath
         
-        of = open (filePath, 'rb')
-        rootObj = pickle.load (of)
-        of.close()
+        rootObj = netlistCache.loadNetlist(filePath)
 
         numWires = rootObj['NUM_WIRES']
         nextCtrl = rootObj['NEXT_CTRL']
@@ -416,13 +457,20 @@ class CircuitSimulator(object):
 
         # create the calculator
         self.createStateArrays()
+        circuitKey = netlistCache.netlistKey(filePath)
+        if circuitKey not in _connectivity:
+            _connectivity[circuitKey] = buildConnectivity(self._wireList,
+                                                          self._transistorList)
+        # Shared with every other simulator loaded from this file
+        self.connectivity = _connectivity[circuitKey]
         self.calculator  = WireCalculator(self._wireList, 
                                           self._transistorList, 
                                           self._wireState, 
                                           self._wirePulled, 
                                           self._transistorState, 
                                           self.gndWireIndex,
-                                          self.vccWireIndex)
+                                          self.vccWireIndex,
+                                          self.connectivity)
 
         return rootObj
 
@@ -497,6 +545,9 @@ class CircuitSimulator(object):
         of = open(filePath, 'wb')
         pickle.dump(rootObj, of)
         of.close()
+        # A cached copy of a rewritten file would be stale
+        netlistCache.clearNetlists()
+        clearConnectivity()
 
 
 # cdef inline int group_contains(stdset[int] & group, int x):
@@ -534,14 +585,59 @@ cdef int    TW_GATE = 0
 cdef int    TW_S1 = 1
 cdef int    TW_S2 = 2
 
+def buildConnectivity(wireList, transistorList):
+    """ Pack a circuit's wire/transistor connections into the int32
+    arrays WireCalculator walks.  Returns (numWires, ctInds, gateInds,
+    transistorWires).  Nothing writes to these once they are built. """
+    numWiresArr = np.zeros(len(wireList), dtype=np.int32)
+    # this is a hack because WHO knows how to do this ? NOT ME
+    ctIndsArr = np.zeros((len(wireList), 4000), dtype=np.int32)
+    gateIndsArr = np.zeros((len(wireList), 4000), dtype=np.int32)
+    transistorWiresArr = np.zeros((len(transistorList), 3), dtype=np.int32)
+
+    cdef np.int32_t[::1] numWires = numWiresArr
+    cdef np.int32_t[:, ::1] ctInds = ctIndsArr
+    cdef np.int32_t[:, ::1] gateInds = gateIndsArr
+    cdef np.int32_t[:, ::1] transistorWires = transistorWiresArr
+
+    # count the wires
+    for wi, w in enumerate(wireList):
+        numWires[wi] = len(w.ctInds) + len(w.gateInds)
+
+        ctInds[wi, 0] = len(w.ctInds)
+        for i, cti in enumerate(w.ctInds):
+            ctInds[wi, i+1] = cti
+
+        gateInds[wi, 0] = len(w.gateInds)
+        for i, gi in enumerate(w.gateInds):
+            gateInds[wi, i+1] = gi
+
+    # create the transistor index array
+    for ti, t in enumerate(transistorList):
+        transistorWires[ti, TW_GATE] = t.gateWireIndex
+        transistorWires[ti, TW_S1] = t.side1WireIndex
+        transistorWires[ti, TW_S2] = t.side2WireIndex
+
+    return (numWiresArr, ctIndsArr, gateIndsArr, transistorWiresArr)
+
+# Connectivity never changes once a circuit is loaded, so every simulator
+# loaded from the same circuit file shares one copy of it.  The arrays
+# stay alive until clearConnectivity() is called.
+# key is netlistCache.netlistKey(path), value is a buildConnectivity() tuple
+_connectivity = dict()
+
+def clearConnectivity():
+    """ Forget every cached connectivity tuple """
+    _connectivity.clear()
+
 @cython.final
 cdef class WireCalculator:
     cdef object _wireList
-    cdef np.uint8_t[:] _wireState
+    cdef np.uint8_t[::1] _wireState
 
-    cdef np.uint8_t[:] _wirePulled
-    cdef np.uint8_t[:] _transistorState
-    cdef np.uint8_t[:] recalcArray
+    cdef np.uint8_t[::1] _wirePulled
+    cdef np.uint8_t[::1] _transistorState
+    cdef np.uint8_t[::1] recalcArray
     cdef int gndWireIndex
     cdef int vccWireIndex
     cdef int numAddWireToGroup
@@ -550,21 +646,19 @@ cdef class WireCalculator:
     cdef object callback_addLogStr
     cdef int recalcCap
     cdef vector[int] recalcOrderStack
-    cdef np.uint8_t[:] newRecalcArray
+    cdef np.uint8_t[::1] newRecalcArray
     cdef vector[int] newRecalcOrderStack
-    cdef np.int32_t[:, :] _transistorWires
-    cdef np.int32_t[:] _numWires
-    # this is a hack because WHO knows how to do this ? NOT ME
-    cdef np.int32_t[:, :] _ctInds
-    cdef np.int32_t[:, :] _gateInds
+    cdef np.int32_t[:, ::1] _transistorWires
+    cdef np.int32_t[::1] _numWires
+    cdef np.int32_t[:, ::1] _ctInds
+    cdef np.int32_t[:, ::1] _gateInds
     cdef int _latestHalfClkCount 
 
     def __init__(self, wireList, transistorList, 
                  wireState, wirePulled, transistorState, # all references
                  gndWireIndex,
-                 vccWireIndex):
-
-        self._numWires = np.zeros(len(wireList), dtype=np.int32)
+                 vccWireIndex,
+                 connectivity=None):
 
         self._wireList = wireList
         #self._transistorList = transistorList
@@ -595,32 +689,12 @@ cdef class WireCalculator:
         self.newRecalcArray = np.zeros(self.recalcCap, dtype=np.uint8) # [0] * self.recalcCap
         self.newRecalcOrderStack.reserve(4000)
 
-        self._ctInds = np.zeros((len(wireList), 4000), dtype=np.int32)
-        self._gateInds = np.zeros((len(wireList), 4000), dtype=np.int32)
-
-        # count the wires
-        for wi, w in enumerate(wireList):
-            self._numWires[wi] = len(w.ctInds) + len(w.gateInds)
-
-            self._ctInds[wi, 0] = len(w.ctInds)
-            for i, cti in enumerate(w.ctInds):
-                self._ctInds[wi, i+1] = cti
-
-            self._gateInds[wi, 0] = len(w.gateInds)
-            for i, gi in enumerate(w.gateInds):
-                self._gateInds[wi, i+1] = gi
+        if connectivity is None:
+            connectivity = buildConnectivity(wireList, transistorList)
+        (self._numWires, self._ctInds, self._gateInds,
+         self._transistorWires) = connectivity
         self._prepForRecalc()
 
-
-        # create the transistor index array
-        self._transistorWires = np.zeros((len(transistorList), 
-                                          3), dtype=np.int32)
-        for ti, t in enumerate(transistorList):
-            self._transistorWires[ti, TW_GATE] = t.gateWireIndex
-            self._transistorWires[ti, TW_S1] = t.side1WireIndex
-            self._transistorWires[ti, TW_S2] = t.side2WireIndex
-            
-
         self._latestHalfClkCount = 0
 
     cdef _prepForRecalc(self):
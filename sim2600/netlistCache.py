@@ -0,0 +1,33 @@
+#
+# netlistCache.py
+# Chip netlists parsed once per process and shared by every simulator
+#
+
+import os, pickle
+
+# key is netlistKey(filePath), value is the unpickled netlist
+_netlists = dict()
+
+def netlistKey(filePath):
+    """ Cache key for a circuit file: its absolute path and modification
+    time, so a rewritten file is never served from a stale entry """
+    path = os.path.abspath(filePath)
+    return (path, os.path.getmtime(path))
+
+def loadNetlist(filePath):
+    """ Return the unpickled netlist in filePath, reading the file only
+    when it is new or has changed since it was last read.  The dict is
+    shared, so callers must not modify it. """
+    key = netlistKey(filePath)
+    if key not in _netlists:
+        # Drop any older version of the same file
+        for oldKey in [k for k in _netlists if k[0] == key[0]]:
+            del _netlists[oldKey]
+        of = open(key[0], 'rb')
+        _netlists[key] = pickle.load(of)
+        of.close()
+    return _netlists[key]
+
+def clearNetlists():
+    """ Forget every cached netlist """
+    _netlists.clear()
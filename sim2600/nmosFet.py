@@ -42,3 +42,18 @@ class NmosFet:
                self.gateWireIndex, self.side1WireIndex, self.side2WireIndex)
         return rstr
 
+
+class TransistorArray:
+    """ Struct-of-arrays snapshot of a chip's transistors, for bulk
+    export.  Every column is an int32 ndarray. """
+
+    def __init__(self, index, gateState, side1WireIndex, side2WireIndex,
+                 gateWireIndex):
+        self.index = index
+        self.gateState = gateState
+        self.side1WireIndex = side1WireIndex
+        self.side2WireIndex = side2WireIndex
+        self.gateWireIndex = gateWireIndex
+
+    def __len__(self):
+        return len(self.index)
@@ -98,3 +98,16 @@ class Wire:
            self.state == Wire.GROUNDED:
             return True
         return False
+
+class WireArray:
+    """ Struct-of-arrays snapshot of a chip's wires, for bulk export.
+    index, state and pulled are int32 ndarrays, name is a list of str. """
+
+    def __init__(self, index, name, state, pulled):
+        self.index = index
+        self.name = name
+        self.state = state
+        self.pulled = pulled
+
+    def __len__(self):
+        return len(self.index)
@@ -1,3 +1,6 @@
+import multiprocessing
+from functools import partial
+
 import numpy as np
 from nose.tools import * 
 
@@ -5,40 +8,92 @@ import sim2600
 from sim2600 import sim2600Console
 from sim2600 import params, sim6502, simTIA
 import sim2600.sim6502
+from sim2600 import netlistCache
 
-def compare_sims(s1func, s2func, ITERS=100):
+# compareloop is a .pyx module; install the import hook ourselves rather
+# than relying on sim6502 having done it
+import pyximport; pyximport.install()
+from sim2600 import compareloop
 
-    for rom in [params.ROMS_DONKEY_KONG, params.ROMS_SPACE_INVADERS, 
-                params.ROMS_PITFALL]:
+ROMS = [params.ROMS_DONKEY_KONG, params.ROMS_SPACE_INVADERS,
+        params.ROMS_PITFALL]
 
-        s1 = s1func(rom)
-        s2 = s2func(rom)
+def _state_buffer(iters, nwires):
+    """
+    Zeroed uint8 buffer padded to a whole number of uint64 words,
+    plus its (iters, nwires) view for recording wire states
+    """
+    nbytes = iters * nwires
+    buf = np.zeros(-(-nbytes // 8) * 8, dtype=np.uint8)
+    return buf, buf[:nbytes].reshape(iters, nwires)
 
+def _assert_states_equal(chip, buf1, states1, buf2, states2):
+    """
+    Compare two state buffers 8 wires per uint64 word, and only look
+    for the first differing wire when they differ
+    """
+    if np.bitwise_xor(buf1.view(np.uint64), buf2.view(np.uint64)).any():
+        i = compareloop.first_mismatch(states1, states2)
+        step, wire = divmod(i, states1.shape[1])
+        raise AssertionError('%s wire %d differs at halfclock %d: %d != %d' %
+                             (chip, wire, step, states1[step, wire],
+                              states2[step, wire]))
+
+def _run_one_rom(rom, s1func, s2func, ITERS):
+    """
+    Run both simulators on one ROM and check they agree
+    """
+    s1 = s1func(rom)
+    s2 = s2func(rom)
 
-        s1_init_state =  s1.sim6507.getWiresState() #  # getWireState()
-        s2_init_state =  s2.sim6507.getWiresState() #  # getWireState()
+    s1_init_state =  s1.sim6507.getWiresState() #  # getWireState()
+    s2_init_state =  s2.sim6507.getWiresState() #  # getWireState()
 
-        np.testing.assert_array_equal(s1_init_state, s2_init_state)
+    np.testing.assert_array_equal(s1_init_state, s2_init_state)
 
-        for i in range(ITERS):
-            s1.advanceOneHalfClock()
-            s2.advanceOneHalfClock()
-            s1_state =  s1.sim6507.getWiresState() #  # getWireState()
-            s2_state =  s2.sim6507.getWiresState() #  # getWireState()
+    # Record every halfclock straight into preallocated rows and
+    # compare the whole run at once
+    ncpu = len(s1_init_state)
+    ntia = len(s1.simTIA.getWiresState())
+    s1_buf, s1_states = _state_buffer(ITERS, ncpu)
+    s2_buf, s2_states = _state_buffer(ITERS, ncpu)
+    s1_tia_buf, s1_tia_states = _state_buffer(ITERS, ntia)
+    s2_tia_buf, s2_tia_states = _state_buffer(ITERS, ntia)
 
-            np.testing.assert_array_equal(s1_state, s2_state)
+    compareloop.record_states(s1, s2, ITERS, s1_states, s2_states,
+                              s1_tia_states, s2_tia_states)
 
-            s1_tia_state =  s1.simTIA.getWiresState() #  # getWireState()
-            s2_tia_state =  s2.simTIA.getWiresState() #  # getWireState()
+    _assert_states_equal('6507', s1_buf, s1_states, s2_buf, s2_states)
+    _assert_states_equal('TIA', s1_tia_buf, s1_tia_states,
+                         s2_tia_buf, s2_tia_states)
 
-            np.testing.assert_array_equal(s1_tia_state, s2_tia_state)
+def _run_one_rom_args(args):
+    return _run_one_rom(*args)
+
+def compare_sims(s1func, s2func, ITERS=100):
+    """
+    The ROMs share no state, so each one runs in its own worker process.
+    s1func and s2func are sent to the workers, so they must be picklable
+    (a class or a functools.partial, not a lambda)
+    """
+    # Parse the netlists before forking so every worker inherits them
+    netlistCache.loadNetlist(params.chip6502File)
+    netlistCache.loadNetlist(params.chipTIAFile)
+
+    pool = multiprocessing.Pool(len(ROMS))
+    try:
+        pool.map(_run_one_rom_args,
+                 [(rom, s1func, s2func, ITERS) for rom in ROMS])
+    finally:
+        pool.close()
+        pool.join()
 
 def test_compare_simple_simple():
     """
     Just compare our default simulator agaginst
     itself
     """
-    s1 = lambda x: sim2600Console.Sim2600Console(x)
+    s1 = sim2600Console.Sim2600Console
     
     compare_sims(s1, s1)
 
@@ -48,8 +103,8 @@ def test_compare_list_sets():
     Just compare our default simulator agaginst
     itself
     """
-    s1 = lambda x: sim2600Console.Sim2600Console(x, sim6502.Sim6502)
-    s2 = lambda x: sim2600Console.Sim2600Console(x, sim6502.Sim6502Sets)
+    s1 = partial(sim2600Console.Sim2600Console, sim6502factory=sim6502.Sim6502)
+    s2 = partial(sim2600Console.Sim2600Console, sim6502factory=sim6502.Sim6502Sets)
     
     compare_sims(s1, s2)
 
@@ -58,8 +113,8 @@ def test_compare_list_mine():
     Just compare our default simulator agaginst
     itself
     """
-    s1 = lambda x: sim2600Console.Sim2600Console(x, sim6502.Sim6502)
-    s2 = lambda x: sim2600Console.Sim2600Console(x, sim6502.MySim6502)
+    s1 = partial(sim2600Console.Sim2600Console, sim6502factory=sim6502.Sim6502)
+    s2 = partial(sim2600Console.Sim2600Console, sim6502factory=sim6502.MySim6502)
     
     compare_sims(s1, s2)
 
@@ -68,8 +123,8 @@ def test_compare_list_mine_tia():
     Just compare our default simulator agaginst
     itself
     """
-    s1 = lambda x: sim2600Console.Sim2600Console(x)
-    s2 = lambda x: sim2600Console.Sim2600Console(x, simTIAfactory=simTIA.MySimTIA)
+    s1 = sim2600Console.Sim2600Console
+    s2 = partial(sim2600Console.Sim2600Console, simTIAfactory=simTIA.MySimTIA)
     
     compare_sims(s1, s2, ITERS=40)
 
@@ -78,9 +133,30 @@ def test_compare_both():
     Just compare our default simulator agaginst
     itself
     """
-    s1 = lambda x: sim2600Console.Sim2600Console(x)
-    s2 = lambda x: sim2600Console.Sim2600Console(x, simTIAfactory=simTIA.MySimTIA, 
-                                                 sim6502factory=sim6502.MySim6502)
+    s1 = sim2600Console.Sim2600Console
+    s2 = partial(sim2600Console.Sim2600Console, simTIAfactory=simTIA.MySimTIA, 
+                 sim6502factory=sim6502.MySim6502)
     
     compare_sims(s1, s2, ITERS=400)
 
+
+def test_compare_mine_mine():
+    """
+    Compare the Cython simulators against themselves.  Both consoles
+    load the same circuit files, so they share connectivity arrays
+    """
+    s1 = partial(sim2600Console.Sim2600Console, simTIAfactory=simTIA.MySimTIA, 
+                 sim6502factory=sim6502.MySim6502)
+    
+    compare_sims(s1, s1)
+
+def test_shared_connectivity():
+    """
+    Cython simulators of the same chip share one copy of the
+    connectivity arrays
+    """
+    a = sim6502.MySim6502()
+    b = sim6502.MySim6502()
+
+    for x, y in zip(a.connectivity, b.connectivity):
+        assert x is y
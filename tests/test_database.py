@@ -0,0 +1,178 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+
+import numpy as np
+
+from sim2600 import database
+from sim2600.wire import WireArray
+from sim2600.nmosFet import TransistorArray
+
+NWIRES = 6
+NFETS = 4
+
+def _frame(wire_state, gate_state):
+    """
+    A WireArray/TransistorArray pair with the given state columns
+    """
+    windex = np.arange(NWIRES, dtype=np.int32)
+    wires = WireArray(windex, ['w%d' % i for i in range(NWIRES)],
+                      np.asarray(wire_state, dtype=np.int32),
+                      np.ones(NWIRES, dtype=np.int32))
+    tindex = np.arange(NFETS, dtype=np.int32)
+    transistors = TransistorArray(tindex, np.asarray(gate_state, dtype=np.int32),
+                                  tindex, tindex + 1, tindex + 2)
+    return wires, transistors
+
+def _frames(nframes):
+    """
+    nframes frames in which wire i toggles at halfclock i
+    """
+    frames = []
+    for hc in range(nframes):
+        wire_state = np.zeros(NWIRES, dtype=np.int32)
+        wire_state[:hc] = 8
+        gate_state = np.zeros(NFETS, dtype=np.int32)
+        gate_state[:hc] = 1
+        frames.append(_frame(wire_state, gate_state))
+    return frames
+
+def setup_module():
+    global TMPDIR
+    TMPDIR = tempfile.mkdtemp()
+
+def teardown_module():
+    shutil.rmtree(TMPDIR)
+
+def _path(name):
+    return os.path.join(TMPDIR, name)
+
+def test_binary_round_trip():
+    """
+    Every committed frame reads back from load() with its halfclock,
+    state and the wire names
+    """
+    frames = _frames(3)
+    with database.BinaryDumpManager(_path('round_trip')) as dump:
+        for hc, (wires, transistors) in enumerate(frames):
+            dump.commit(hc, wires, transistors)
+
+    wires, transistors, names = database.BinaryDumpManager.load(_path('round_trip'))
+
+    assert wires.shape == (3 * NWIRES,)
+    assert transistors.shape == (3 * NFETS,)
+    np.testing.assert_array_equal(wires['hc'], np.repeat(np.arange(3), NWIRES))
+    np.testing.assert_array_equal(wires['idx'], np.tile(np.arange(NWIRES), 3))
+    np.testing.assert_array_equal(
+        wires['state'], np.concatenate([w.state for w, t in frames]))
+    np.testing.assert_array_equal(
+        transistors['state'], np.concatenate([t.gateState for w, t in frames]))
+    assert names == dict((i, 'w%d' % i) for i in range(NWIRES))
+
+def test_binary_empty_dump():
+    """
+    A dump closed without any commits loads as empty arrays
+    """
+    database.BinaryDumpManager(_path('empty')).close()
+
+    wires, transistors, names = database.BinaryDumpManager.load(_path('empty'))
+
+    assert wires.shape == (0,)
+    assert transistors.shape == (0,)
+    assert names == {}
+
+def test_existing_file_without_overwrite():
+    """
+    An existing database file is left alone and raises ValueError
+    """
+    path = _path('exists.db')
+    open(path, 'w').close()
+
+    try:
+        database.DatabaseManager(path)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('expected ValueError for an existing file')
+    assert os.path.getsize(path) == 0
+
+def test_existing_file_with_overwrite():
+    """
+    With overwrite=True an existing database file is replaced
+    """
+    path = _path('overwrite.db')
+    with open(path, 'w') as f:
+        f.write('not a database')
+
+    wires, transistors = _frames(1)[0]
+    with database.DatabaseManager(path, overwrite=True) as db:
+        db.commit(0, wires, transistors)
+
+    connection = sqlite3.connect(path)
+    assert connection.execute('SELECT COUNT(*) FROM wires').fetchone() == (NWIRES,)
+    connection.close()
+
+def test_commit_every_must_be_positive():
+    """
+    commit_every below 1 is rejected by both dump managers
+    """
+    for manager, name in [(database.DatabaseManager, 'stride.db'),
+                          (database.BinaryDumpManager, 'stride')]:
+        for commit_every in (0, -1):
+            try:
+                manager(_path(name), commit_every=commit_every)
+            except ValueError:
+                pass
+            else:
+                raise AssertionError('expected ValueError for commit_every=%d'
+                                     % commit_every)
+
+def _rows(path, table):
+    connection = sqlite3.connect(path)
+    rows = connection.execute('SELECT idx, halfclock, state FROM %s' % table).fetchall()
+    connection.close()
+    return rows
+
+def test_delta_writes_changed_rows():
+    """
+    With delta=True the first written frame is complete and later frames
+    only hold the rows that changed since the last written frame.  The
+    commit_every stride applies before the delta.
+    """
+    path = _path('delta.db')
+    frames = _frames(5)
+    with database.DatabaseManager(path, commit_every=2, delta=True) as db:
+        for hc, (wires, transistors) in enumerate(frames):
+            db.commit(hc, wires, transistors)
+
+    # Halfclocks 0, 2 and 4 are written; wires 0-1 change by halfclock 2
+    # and wires 2-3 by halfclock 4
+    assert _rows(path, 'wires') == (
+        [(i, 0, 0) for i in range(NWIRES)] +
+        [(0, 2, 8), (1, 2, 8), (2, 4, 8), (3, 4, 8)])
+    assert _rows(path, 'transistors') == (
+        [(i, 0, 0) for i in range(NFETS)] +
+        [(0, 2, 1), (1, 2, 1), (2, 4, 1), (3, 4, 1)])
+
+def test_delta_rollback_writes_full_frame():
+    """
+    After a rolled back commit the next commit writes every row again
+    """
+    path = _path('delta_rollback.db')
+    frames = _frames(3)
+    with database.DatabaseManager(path, delta=True) as db:
+        db.commit(0, *frames[0])
+        try:
+            # Fails after the wires are inserted, inside the transaction
+            db.commit(1, frames[1][0], None)
+        except Exception:
+            pass
+        else:
+            raise AssertionError('expected the commit to fail')
+        db.commit(2, *frames[2])
+
+    rows = _rows(path, 'wires')
+    assert [r for r in rows if r[1] == 1] == []
+    assert [r for r in rows if r[1] == 2] == \
+        [(i, 2, 8 if i < 2 else 0) for i in range(NWIRES)]
@@ -0,0 +1,43 @@
+import os
+import pickle
+import shutil
+import tempfile
+
+from sim2600 import netlistCache
+
+def setup_module():
+    global TMPDIR
+    TMPDIR = tempfile.mkdtemp()
+
+def teardown_module():
+    shutil.rmtree(TMPDIR)
+    netlistCache.clearNetlists()
+
+def _write(path, netlist, mtime):
+    with open(path, 'wb') as f:
+        pickle.dump(netlist, f)
+    os.utime(path, (mtime, mtime))
+
+def test_cached_until_rewritten():
+    """
+    The same netlist object is returned until the file changes on disk
+    """
+    path = os.path.join(TMPDIR, 'net.pkl')
+    _write(path, {'NUM_WIRES': 1}, 1000000)
+
+    first = netlistCache.loadNetlist(path)
+    assert netlistCache.loadNetlist(path) is first
+
+    _write(path, {'NUM_WIRES': 2}, 1000001)
+    assert netlistCache.loadNetlist(path) == {'NUM_WIRES': 2}
+
+def test_clear():
+    """
+    clearNetlists() forces the next load to read the file again
+    """
+    path = os.path.join(TMPDIR, 'clear.pkl')
+    _write(path, {'NUM_WIRES': 1}, 1000000)
+
+    first = netlistCache.loadNetlist(path)
+    netlistCache.clearNetlists()
+    assert netlistCache.loadNetlist(path) is not first